@@ -1,10 +1,25 @@
+import importlib
+
 from .base import BaseBrandExtractor, BrandColors, ExtractionResult, PlaywrightMixin
-from .method1_dom_naive import DOMNaiveExtractor
-from .method4_screenshot_palette import ScreenshotPaletteExtractor
-from .method2_css_llm import CSSLLMExtractor
-from .method3_screenshot_direct import ScreenshotDirectExtractor
 from .analyzer import BrandAnalyzer, ExtractionMethod
 
+# Extractors are resolved lazily so importing the package does not pull in
+# every method's dependencies
+_LAZY_EXTRACTORS = {
+    'DOMNaiveExtractor': '.method1_dom_naive',
+    'ScreenshotPaletteExtractor': '.method4_screenshot_palette',
+    'CSSLLMExtractor': '.method2_css_llm',
+    'ScreenshotDirectExtractor': '.method3_screenshot_direct',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXTRACTORS:
+        module = importlib.import_module(_LAZY_EXTRACTORS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     'BaseBrandExtractor',
     'BrandColors', 
@@ -4,13 +4,14 @@ Coordinates different extraction methods and provides a unified interface
 """
 
 from typing import Dict, Any, Optional, List
+from collections import Counter
 from enum import Enum
+import asyncio
+import importlib
 import logging
-from .base import ExtractionResult
-from .method1_dom_naive import DOMNaiveExtractor
-from .method4_screenshot_palette import ScreenshotPaletteExtractor
-from .method2_css_llm import CSSLLMExtractor
-from .method3_screenshot_direct import ScreenshotDirectExtractor
+import os
+from cachetools import TTLCache
+from .base import BaseBrandExtractor, ExtractionResult
 
 logger = logging.getLogger(__name__)
 
@@ -22,34 +23,92 @@ class ExtractionMethod(str, Enum):
     SCREENSHOT_DIRECT = "screenshot_direct"
 
 
+# Extractor modules are imported on first use so unused methods
+# (and their LLM/imaging dependencies) cost nothing at startup
+_EXTRACTOR_FACTORIES = {
+    ExtractionMethod.DOM_NAIVE: (".method1_dom_naive", "DOMNaiveExtractor"),
+    ExtractionMethod.SCREENSHOT_PALETTE: (".method4_screenshot_palette", "ScreenshotPaletteExtractor"),
+    ExtractionMethod.CSS_LLM: (".method2_css_llm", "CSSLLMExtractor"),
+    ExtractionMethod.SCREENSHOT_DIRECT: (".method3_screenshot_direct", "ScreenshotDirectExtractor")
+}
+
+
+# Successful results keyed on (url, method, options); brand colors change on
+# the order of months, so entries live for a day unless configured otherwise
+RESULT_CACHE_SIZE = int(os.getenv("BRAND_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = int(os.getenv("BRAND_CACHE_TTL_SECONDS", "86400"))
+_RESULT_CACHE = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+_RESULT_LOCKS: Dict[tuple, asyncio.Lock] = {}
+# Callers holding or queued on each lock; the lock is dropped once the last one leaves
+_RESULT_LOCK_USERS: Counter = Counter()
+
+
+def _is_cacheable(result: ExtractionResult) -> bool:
+    """Only real extractions are cached; fallback defaults would outlive a transient error"""
+    return result.success and not (result.metadata or {}).get("fallback")
+
+
 class BrandAnalyzer:
     
     def __init__(self):
-        self.extractors = {
-            ExtractionMethod.DOM_NAIVE: DOMNaiveExtractor(),
-            ExtractionMethod.SCREENSHOT_PALETTE: ScreenshotPaletteExtractor(),
-            ExtractionMethod.CSS_LLM: CSSLLMExtractor(),
-            ExtractionMethod.SCREENSHOT_DIRECT: ScreenshotDirectExtractor()
-        }
+        self._factories = _EXTRACTOR_FACTORIES
+        self._instances: Dict[ExtractionMethod, BaseBrandExtractor] = {}
+    
+    def _get_extractor(self, method: ExtractionMethod) -> BaseBrandExtractor:
+        extractor = self._instances.get(method)
+        if extractor is None:
+            module_name, class_name = self._factories[method]
+            module = importlib.import_module(module_name, __package__)
+            extractor = self._instances[method] = getattr(module, class_name)()
+        return extractor
     
     async def analyze_website(self, url: str, method: Optional[ExtractionMethod] = None, **kwargs) -> ExtractionResult:
         if method is None:
             method = ExtractionMethod.DOM_NAIVE
-            
+        
+        try:
+            key = (url, method, tuple(sorted(kwargs.items())))
+            hash(key)
+        except TypeError:
+            # Unhashable options cannot be cached
+            return await self._analyze_uncached(url, method, **kwargs)
+        
+        if key in _RESULT_CACHE:
+            logger.info("Cache hit for %s using method: %s", url, method)
+            return _RESULT_CACHE[key]
+        
+        # Concurrent requests for the same key wait for a single extraction
+        lock = _RESULT_LOCKS.setdefault(key, asyncio.Lock())
+        _RESULT_LOCK_USERS[key] += 1
+        try:
+            async with lock:
+                if key in _RESULT_CACHE:
+                    return _RESULT_CACHE[key]
+                result = await self._analyze_uncached(url, method, **kwargs)
+                if _is_cacheable(result):
+                    _RESULT_CACHE[key] = result
+                return result
+        finally:
+            _RESULT_LOCK_USERS[key] -= 1
+            if not _RESULT_LOCK_USERS[key]:
+                del _RESULT_LOCK_USERS[key]
+                del _RESULT_LOCKS[key]
+    
+    async def _analyze_uncached(self, url: str, method: ExtractionMethod, **kwargs) -> ExtractionResult:
         try:
-            logger.info(f"Analyzing {url} using method: {method}")
+            logger.info("Analyzing %s using method: %s", url, method)
             
-            if method not in self.extractors:
+            if method not in self._factories:
                 raise ValueError(f"Unknown extraction method: {method}")
             
-            extractor = self.extractors[method]
+            extractor = self._get_extractor(method)
             result = await extractor.extract_brand_elements(url, **kwargs)
             
-            logger.info(f"Analysis completed for {url} using {method}: success={result.success}")
+            logger.info("Analysis completed for %s using %s: success=%s", url, method, result.success)
             return result
             
         except Exception as e:
-            logger.error(f"Error analyzing {url} with method {method}: {str(e)}")
+            logger.error("Error analyzing %s with method %s: %s", url, method, e)
             return ExtractionResult(
                 fonts=["Arial", "sans-serif"],
                 primaryColor="#333333",
@@ -60,4 +119,33 @@ class BrandAnalyzer:
                 message=f"Analysis failed: {str(e)}",
                 method=method.value if method else "unknown",
                 metadata={"error": str(e)}
-            )
\ No newline at end of file
+            )
+    
+    async def analyze_websites(self, urls: List[str], method: Optional[ExtractionMethod] = None,
+                               max_concurrency: int = 5, **kwargs) -> List[ExtractionResult]:
+        """Analyze several websites concurrently, returning results in input order"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def _analyze_one(url: str) -> ExtractionResult:
+            async with semaphore:
+                return await self.analyze_website(url, method, **kwargs)
+        
+        return await asyncio.gather(*[_analyze_one(url) for url in urls])
+    
+    async def analyze_websites_batched(self, urls: List[str], **kwargs) -> List[ExtractionResult]:
+        """Analyze several websites with the screenshot-palette method, sharing LLM requests between them"""
+        method = ExtractionMethod.SCREENSHOT_PALETTE
+        options = tuple(sorted(kwargs.items()))
+        results: List[Optional[ExtractionResult]] = [_RESULT_CACHE.get((url, method, options)) for url in urls]
+        
+        pending = list(dict.fromkeys(url for url, result in zip(urls, results) if result is None))
+        if pending:
+            logger.info("Batch analyzing %d websites using method: %s", len(pending), method)
+            extractor = self._get_extractor(method)
+            fresh = dict(zip(pending, await extractor.extract_brand_elements_batch(pending, **kwargs)))
+            for url, result in fresh.items():
+                if _is_cacheable(result):
+                    _RESULT_CACHE[(url, method, options)] = result
+            results = [result if result is not None else fresh[url] for url, result in zip(urls, results)]
+        
+        return results
@@ -1,7 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
 from pydantic import BaseModel
+from aiolimiter import AsyncLimiter
+from cachetools import LRUCache
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import asyncio
+import base64
+import hashlib
 import logging
+import os
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from playwright.async_api import Browser, BrowserContext, Page, Playwright
 
 logger = logging.getLogger(__name__)
 class BrandColors(BaseModel):
@@ -22,11 +34,144 @@ class ExtractionResult(BaseModel):
     method: str
     metadata: Optional[Dict[str, Any]] = None
 
+
+# Palette returned when an analysis step fails; extractors hand back this exact
+# instance so results built from it can be flagged as fallbacks
+FALLBACK_BRAND_COLORS = BrandColors(
+    primaryColor="#333333",
+    secondaryColor="#666666",
+    backgroundColor="#FFFFFF",
+    linkColor="#0066CC"
+)
+
+# Shared by every LLM-backed extractor so HTTP connections are reused across
+# extractions; created lazily because the constructor requires OPENAI_API_KEY
+_openai_client: Optional["AsyncOpenAI"] = None
+
+
+def get_openai_client() -> "AsyncOpenAI":
+    """Return the process-wide AsyncOpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+
+        _openai_client = AsyncOpenAI(max_retries=2, timeout=30.0)
+    return _openai_client
+
+
+async def close_openai_client():
+    """Close the shared AsyncOpenAI client's connection pool, if one was created"""
+    global _openai_client
+    if _openai_client is not None:
+        try:
+            await _openai_client.close()
+        except Exception as e:
+            logger.warning("Error closing OpenAI client: %s", e)
+        _openai_client = None
+
+
+def jpeg_data_url(image_bytes: bytes) -> str:
+    """Encode JPEG bytes as a data URL for an input_image part"""
+    # One ASCII decode of the base64 output; it is pure ASCII, so UTF-8 decoding is wasted work
+    return "data:image/jpeg;base64," + base64.b64encode(image_bytes).decode('ascii')
+
+
+# Caps in-flight LLM requests across all extractions so batch runs stay under
+# the org's rate limits instead of burning throughput on 429 retries
+LLM_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "8"))
+LLM_SEMAPHORE = asyncio.Semaphore(LLM_CONCURRENCY)
+# Token bucket matching the account's requests-per-minute quota; the semaphore
+# alone still lets short fast requests exceed RPM
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM", "500"))
+LLM_RATE_LIMITER = AsyncLimiter(LLM_REQUESTS_PER_MINUTE, 60)
+
+
+@asynccontextmanager
+async def llm_request_slot():
+    """Hold a concurrency slot and a rate-limit token for one LLM request"""
+    async with LLM_SEMAPHORE, LLM_RATE_LIMITER:
+        yield
+
+
+# Font ranking tables shared by the extractors' _process_fonts
+GENERIC_FONTS = frozenset({'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy', 'system-ui'})
+SYSTEM_FONTS_LOWER = frozenset(font.lower() for font in (
+    'Arial', 'Helvetica', 'Times', 'Courier', 'Verdana', 'Georgia', 
+    'Palatino', 'Garamond', 'Bookman', 'Comic Sans MS', 'Trebuchet MS', 
+    'Arial Black', 'Impact'
+))
+DEFAULT_FONTS = ('Helvetica', 'Arial', 'sans-serif')
+
+def parse_font_families(font_family_values: List[str]) -> List[str]:
+    """Split raw CSS font-family values into unique, unquoted family names in first-seen order"""
+    families = {}
+    for value in font_family_values:
+        if not value or value == 'inherit':
+            continue
+        for font in value.split(','):
+            font = font.strip().replace('"', '').replace("'", '')
+            if font and 'inherit' not in font and 'initial' not in font:
+                families[font] = None
+    return list(families)
+
+
+@lru_cache(maxsize=1024)
+def rank_fonts(fonts: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Pick the two brand fonts, preferring custom/web fonts over system fonts.
+
+    Memoized on the ordered family tuple: pages from the same site repeat the
+    same stack, and ranking depends on first-seen order so it is not sorted.
+    """
+    custom_fonts = []
+    fallback_fonts = []
+
+    for font in fonts:
+        lower_font = font.lower()
+        if lower_font in GENERIC_FONTS:
+            continue
+        if lower_font in SYSTEM_FONTS_LOWER:
+            fallback_fonts.append(font)
+        else:
+            custom_fonts.append(font)
+
+    # Use custom fonts first, then fallback to system fonts
+    final_fonts = custom_fonts[:2] if custom_fonts else fallback_fonts[:2]
+
+    # Ensure we always have at least 2 fonts
+    if len(final_fonts) < 2:
+        final_fonts.extend(DEFAULT_FONTS)
+    return tuple(final_fonts[:2])
+
+
+# Parsed LLM answers keyed by a hash of the exact model input, so repeated
+# pages (or identical screenshots) skip the LLM round-trip entirely
+_LLM_CACHE = LRUCache(maxsize=4096)
+
+
+def llm_cache_key(*parts) -> str:
+    """Hash the given str/bytes parts into a cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get_cached_brand_colors(key: str) -> Optional[BrandColors]:
+    data = _LLM_CACHE.get(key)
+    return BrandColors(**data) if data is not None else None
+
+
+def cache_brand_colors(key: str, colors: BrandColors):
+    _LLM_CACHE[key] = colors.model_dump()
+
+
 class BaseBrandExtractor(ABC):
     
     def __init__(self, method_name: str):
         self.method_name = method_name
-        self.logger = logging.getLogger(f"{__name__}.{method_name}")
+        # Extractors are long-lived and shared, so log through their module logger
+        self.logger = logging.getLogger(type(self).__module__)
     
     @abstractmethod
     async def extract_brand_elements(self, url: str, **kwargs) -> ExtractionResult:
@@ -43,7 +188,12 @@ class BaseBrandExtractor(ABC):
         pass
     
     def _create_success_result(self, colors: BrandColors, fonts: List[str], 
-                              metadata: Optional[Dict[str, Any]] = None) -> ExtractionResult:
+                              metadata: Optional[Dict[str, Any]] = None,
+                              fallback: bool = False) -> ExtractionResult:
+        # Results that fell back to defaults are still returned, but marked so
+        # callers (e.g. the result cache) can tell them from real extractions
+        if fallback or colors is FALLBACK_BRAND_COLORS:
+            metadata = {**(metadata or {}), "fallback": True}
         return ExtractionResult(
             fonts=fonts,
             primaryColor=colors.primaryColor,
@@ -71,33 +221,133 @@ class BaseBrandExtractor(ABC):
         )
 
 
+_LAUNCH_OPTIONS = {
+    'headless': True,
+    'args': [
+        '--no-sandbox',
+        '--disable-setuid-sandbox',
+        '--disable-dev-shm-usage',
+        '--disable-accelerated-2d-canvas',
+        '--no-first-run',
+        '--no-zygote',
+        '--disable-gpu',
+        '--disable-extensions',
+        '--disable-background-timer-throttling',
+        '--disable-backgrounding-occluded-windows',
+        '--disable-renderer-backgrounding'
+    ]
+}
+
+# Idle contexts kept per viewport size for reuse by later extractions
+_CONTEXT_POOL_SIZE = 4
+
 class PlaywrightMixin:
-    async def _setup_browser(self):
-        from playwright.async_api import async_playwright
+    # Process-wide Playwright driver and Chromium instance, shared by all extractors.
+    # Each extraction gets its own lightweight BrowserContext instead of a new browser.
+    # State is always written on PlaywrightMixin itself: assigning through cls would
+    # give every extractor subclass its own browser.
+    _playwright: Optional["Playwright"] = None
+    _browser: Optional["Browser"] = None
+    _browser_lock = asyncio.Lock()
+    # Released contexts, keyed by viewport; pages are closed and cookies cleared on release
+    _context_pool: Dict[Tuple[int, int], List["BrowserContext"]] = {}
+    _context_viewports: Dict["BrowserContext", Tuple[int, int]] = {}
+    
+    @classmethod
+    async def _get_browser(cls) -> "Browser":
+        async with cls._browser_lock:
+            if PlaywrightMixin._browser is None or not PlaywrightMixin._browser.is_connected():
+                from playwright.async_api import async_playwright
+                
+                if PlaywrightMixin._playwright is None:
+                    PlaywrightMixin._playwright = await async_playwright().start()
+                logger.info("Launching shared Chromium instance")
+                PlaywrightMixin._browser = await PlaywrightMixin._playwright.chromium.launch(**_LAUNCH_OPTIONS)
+            return PlaywrightMixin._browser
+    
+    @classmethod
+    async def warm_up(cls):
+        """Launch the shared browser ahead of the first extraction"""
+        try:
+            await cls._get_browser()
+        except Exception as e:
+            # Extractions retry the launch, so a failed warm-up is not fatal
+            logger.warning("Browser warm-up failed: %s", e)
+    
+    @classmethod
+    async def shutdown(cls):
+        """Close the shared browser and stop the Playwright driver"""
+        async with cls._browser_lock:
+            # Pooled contexts are closed along with the browser
+            PlaywrightMixin._context_pool.clear()
+            PlaywrightMixin._context_viewports.clear()
+            if PlaywrightMixin._browser is not None:
+                try:
+                    await PlaywrightMixin._browser.close()
+                except Exception as e:
+                    logger.warning("Error closing shared browser: %s", e)
+                PlaywrightMixin._browser = None
+            if PlaywrightMixin._playwright is not None:
+                try:
+                    await PlaywrightMixin._playwright.stop()
+                except Exception as e:
+                    logger.warning("Error stopping Playwright: %s", e)
+                PlaywrightMixin._playwright = None
+    
+    async def _open_page(self, width: int = 1920, height: int = 1080) -> Tuple["BrowserContext", "Page"]:
+        """Open a page in a pooled or new context on the shared browser; the caller releases the context"""
+        browser = await self._get_browser()
+        viewport = (width, height)
+        pool = PlaywrightMixin._context_pool.get(viewport, [])
+        context = None
+        while pool and context is None:
+            candidate = pool.pop()
+            if candidate.browser is browser:
+                context = candidate
+            else:
+                # Left over from a browser that has since been relaunched
+                PlaywrightMixin._context_viewports.pop(candidate, None)
+        if context is None:
+            # Sized at creation so the page never has to re-layout for a viewport change
+            context = await browser.new_context(viewport={'width': width, 'height': height})
+            PlaywrightMixin._context_viewports[context] = viewport
+        page = await context.new_page()
+        return context, page
+    
+    async def _block_resources(self, page, resource_types):
+        """Abort requests for resource types the extractor does not need"""
+        blocked = frozenset(resource_types)
         
-        self.playwright = await async_playwright().start()
-        launch_options = {
-            'headless': True,
-            'args': [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-extensions',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding'
-            ]
-        }
+        async def handle_route(route):
+            if route.request.resource_type in blocked:
+                await route.abort()
+            else:
+                await route.continue_()
         
-        self.browser = await self.playwright.chromium.launch(**launch_options)
-        return await self.browser.new_page()
+        await page.route("**/*", handle_route)
     
-    async def _cleanup_browser(self):
-        if hasattr(self, 'browser') and self.browser:
-            await self.browser.close()
-        if hasattr(self, 'playwright') and self.playwright:
-            await self.playwright.stop()
+    async def _cleanup_browser(self, context: Optional["BrowserContext"]):
+        # The context is owned by the caller; nothing is stored on the extractor,
+        # so concurrent extractions sharing one instance cannot clobber each other
+        if context is None:
+            return
+        viewport = PlaywrightMixin._context_viewports.get(context)
+        try:
+            if viewport is not None and context.browser is not None and context.browser.is_connected():
+                # Closing the pages drops their route handlers; cookies must not
+                # leak from one analyzed site into the next
+                for page in context.pages:
+                    await page.close()
+                await context.clear_cookies()
+                pool = PlaywrightMixin._context_pool.setdefault(viewport, [])
+                if len(pool) < _CONTEXT_POOL_SIZE:
+                    pool.append(context)
+                    return
+        except Exception as e:
+            logger.warning("Error resetting browser context for reuse: %s", e)
+        PlaywrightMixin._context_viewports.pop(context, None)
+        try:
+            await context.close()
+        except Exception as e:
+            # Never let cleanup of a dead context mask the extraction result
+            logger.warning("Error closing browser context: %s", e)
@@ -1,8 +1,103 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from collections import Counter
+import functools
+import logging
 import re
+import numpy as np
 import webcolors
-from .base import BaseBrandExtractor, BrandColors, ExtractionResult, PlaywrightMixin
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from .base import (BaseBrandExtractor, BrandColors, ExtractionResult, PlaywrightMixin,
+                   rank_fonts)
+
+_RGB_RE = re.compile(r'(\d+)')
+
+# CSS named colors, looked up directly instead of via webcolors.name_to_hex
+_NAMED_COLORS = {
+    name.lower(): webcolors.name_to_hex(name).upper()
+    for name in webcolors.names(webcolors.CSS3)
+}
+
+# sRGB byte value -> weighted linear luminance contribution per channel
+_SRGB = np.arange(256) / 255.0
+_LINEAR = np.where(_SRGB <= 0.03928, _SRGB / 12.92, ((_SRGB + 0.055) / 1.055) ** 2.4)
+_LUM_R, _LUM_G, _LUM_B = _LINEAR * 0.2126, _LINEAR * 0.7152, _LINEAR * 0.0722
+
+# Number of k-means clusters used to merge near-duplicate colors
+_PALETTE_CLUSTERS = 4
+
+
+@functools.lru_cache(maxsize=4096)
+def _convert_to_hex_cached(color: str) -> Optional[str]:
+    """Convert various color formats to hex"""
+    try:
+        color = color.strip()
+        
+        # Already hex
+        if color.startswith('#'):
+            return color.upper()
+        
+        # RGB format
+        if color.startswith('rgb'):
+            # Extract numbers from rgb(r, g, b) or rgba(r, g, b, a)
+            numbers = _RGB_RE.findall(color)
+            if len(numbers) >= 3:
+                r, g, b = map(int, numbers[:3])
+                return f"#{r:02X}{g:02X}{b:02X}"
+        
+        # Named colors
+        return _NAMED_COLORS.get(color.lower())
+        
+    except Exception:
+        return None
+
+
+def _weighted_kmeans(X: np.ndarray, w: np.ndarray, k: int, max_iter: int = 50) -> np.ndarray:
+    """Weighted Lloyd's k-means with sort-means pruning.
+    
+    Seeding is a deterministic k-means++ variant: start from the heaviest point,
+    then repeatedly add the point with the largest weight * squared distance to
+    the chosen seeds, so near-duplicate heavy colors do not take separate seeds.
+    
+    By the triangle inequality, a center c_j cannot be closer to x than x's own
+    center c_a when ||c_a - c_j|| >= 2 * ||x - c_a||, so each point only measures
+    the neighbouring centers (sorted by distance from c_a) that fail this bound.
+    """
+    seeds = [int(np.argmax(w))]
+    min_sq_dist = ((X - X[seeds[0]]) ** 2).sum(-1)
+    for _ in range(k - 1):
+        seeds.append(int(np.argmax(w * min_sq_dist)))
+        min_sq_dist = np.minimum(min_sq_dist, ((X - X[seeds[-1]]) ** 2).sum(-1))
+    centers = X[seeds].copy()
+    labels = np.argmin(((X[:, None, :] - centers[None, :, :]) ** 2).sum(-1), axis=1)
+    
+    for _ in range(max_iter):
+        for j in range(k):
+            mask = labels == j
+            if mask.any():
+                centers[j] = np.average(X[mask], axis=0, weights=w[mask])
+        
+        center_dist = np.sqrt(((centers[:, None, :] - centers[None, :, :]) ** 2).sum(-1))
+        np.fill_diagonal(center_dist, np.inf)
+        neighbours = np.argsort(center_dist, axis=1)[:, :k - 1]
+        
+        new_labels = labels.copy()
+        own_dist = np.sqrt(((X - centers[labels]) ** 2).sum(-1))
+        best_dist = own_dist.copy()
+        for rank in range(k - 1):
+            candidates = neighbours[labels, rank]
+            active = np.flatnonzero(center_dist[labels, candidates] < 2 * own_dist)
+            if not len(active):
+                break
+            dist = np.sqrt(((X[active] - centers[candidates[active]]) ** 2).sum(-1))
+            closer = dist < best_dist[active]
+            new_labels[active[closer]] = candidates[active[closer]]
+            best_dist[active[closer]] = dist[closer]
+        
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    
+    return labels
 
 
 class DOMNaiveExtractor(BaseBrandExtractor, PlaywrightMixin):
@@ -13,19 +108,30 @@ class DOMNaiveExtractor(BaseBrandExtractor, PlaywrightMixin):
     
     async def extract_brand_elements(self, url: str, **kwargs) -> ExtractionResult:
         """Extract brand elements using DOM analysis"""
-        page = None
+        skip_assets = kwargs.get('skip_assets', True)
+        include_raw = kwargs.get('include_raw', False)
+        context = None
         
         try:
             # Setup browser and navigate
-            page = await self._setup_browser()
-            await page.set_viewport_size({'width': 1920, 'height': 1080})
+            context, page = await self._open_page()
+            if skip_assets:
+                # Stylesheets are kept since computed colors depend on them
+                await self._block_resources(page, ('image', 'media', 'font'))
             
-            self.logger.info(f"Navigating to {url}")
-            await page.goto(url, wait_until='domcontentloaded', timeout=10000)
+            self.logger.info("Navigating to %s", url)
+            await page.goto(url, wait_until='commit', timeout=5000)
+            try:
+                await page.wait_for_load_state('domcontentloaded', timeout=3000)
+            except PlaywrightTimeoutError:
+                # A partially parsed document still has enough nodes to style
+                self.logger.warning("Timeout waiting for DOMContentLoaded on %s", url)
             
             # Extract fonts and colors
-            fonts = await self._extract_fonts(page)
-            colors = await self._extract_colors(page)
+            extracted = await self._extract_all(page)
+            fallback = extracted.pop("fallback", False)
+            fonts = extracted.pop("fonts")
+            colors = extracted
             
             # Process extracted data
             processed_fonts = self._process_fonts(fonts)
@@ -40,35 +146,51 @@ class DOMNaiveExtractor(BaseBrandExtractor, PlaywrightMixin):
             )
             
             metadata = {
-                "raw_fonts": fonts,
-                "raw_colors": colors,
                 "processing_stats": {
                     "total_fonts_found": len(fonts),
-                    "total_colors_found": sum(len(color_list) for color_list in colors.values())
+                    "total_colors_found": sum(sum(color_counts.values()) for color_counts in colors.values())
                 }
             }
+            if include_raw:
+                metadata["raw_fonts"] = fonts
+                metadata["raw_colors"] = colors
             
-            return self._create_success_result(brand_colors, processed_fonts["fonts"], metadata)
+            return self._create_success_result(brand_colors, processed_fonts["fonts"], metadata, fallback)
             
         except Exception as e:
-            self.logger.error(f"Error during DOM extraction: {str(e)}")
+            self.logger.error("Error during DOM extraction: %s", e)
             return self._create_error_result(str(e))
         
         finally:
-            await self._cleanup_browser()
+            await self._cleanup_browser(context)
     
-    async def _extract_fonts(self, page) -> List[str]:
-        """Extract font families from the page using JavaScript"""
+    async def _extract_all(self, page) -> Dict[str, Any]:
+        """Extract font families and colors from key elements in a single DOM pass"""
         try:
-            font_extraction_script = """
+            extraction_script = """
             () => {
                 const fontFamilies = new Set();
-                const elements = document.querySelectorAll('*');
+                // Count occurrences per color in the page so only unique values cross CDP
+                const colors = {
+                    textColors: new Map(),
+                    backgroundColors: new Map(),
+                    borderColors: new Map(),
+                    linkColors: new Map()
+                };
+                const count = (bucket, value) => bucket.set(value, (bucket.get(value) || 0) + 1);
+                
+                // Style every element that usually carries brand styling, then a
+                // bounded sample of the rest instead of the whole DOM
+                const keySelectors = 'body,h1,h2,h3,h4,h5,h6,p,a,button,header,nav,footer,[role="button"]';
+                const maxSampledElements = 2000;
+                const visited = new Set();
                 
-                for (let element of elements) {
+                const visit = (element) => {
+                    visited.add(element);
                     const computedStyle = window.getComputedStyle(element);
-                    const fontFamily = computedStyle.fontFamily;
                     
+                    // Extract font families
+                    const fontFamily = computedStyle.fontFamily;
                     if (fontFamily && fontFamily !== 'inherit') {
                         // Clean up font family names
                         const fonts = fontFamily.split(',').map(font => 
@@ -80,148 +202,114 @@ class DOMNaiveExtractor(BaseBrandExtractor, PlaywrightMixin):
                             }
                         });
                     }
-                }
-                
-                return Array.from(fontFamilies);
-            }
-            """
-            
-            fonts = await page.evaluate(font_extraction_script)
-            self.logger.info(f"Extracted {len(fonts)} font families")
-            return fonts
-            
-        except Exception as e:
-            self.logger.error(f"Error extracting fonts: {str(e)}")
-            return ["Arial", "sans-serif"]
-    
-    async def _extract_colors(self, page) -> Dict[str, List[str]]:
-        """Extract colors from the page using JavaScript"""
-        try:
-            color_extraction_script = """
-            () => {
-                const colors = {
-                    textColors: [],
-                    backgroundColors: [],
-                    borderColors: [],
-                    linkColors: []
-                };
-                
-                const elements = document.querySelectorAll('*');
-                
-                for (let element of elements) {
-                    const computedStyle = window.getComputedStyle(element);
                     
                     // Extract text colors
                     const color = computedStyle.color;
                     if (color && color !== 'rgba(0, 0, 0, 0)' && color !== 'transparent') {
-                        colors.textColors.push(color);
+                        count(colors.textColors, color);
                     }
                     
                     // Extract background colors
                     const backgroundColor = computedStyle.backgroundColor;
                     if (backgroundColor && backgroundColor !== 'rgba(0, 0, 0, 0)' && backgroundColor !== 'transparent') {
-                        colors.backgroundColors.push(backgroundColor);
+                        count(colors.backgroundColors, backgroundColor);
                     }
                     
                     // Extract border colors
                     const borderColor = computedStyle.borderColor;
                     if (borderColor && borderColor !== 'rgba(0, 0, 0, 0)' && borderColor !== 'transparent') {
-                        colors.borderColors.push(borderColor);
+                        count(colors.borderColors, borderColor);
                     }
                     
                     // Extract link colors specifically
                     if (element.tagName === 'A') {
-                        colors.linkColors.push(color);
+                        count(colors.linkColors, color);
                     }
+                };
+                
+                for (const element of document.querySelectorAll(keySelectors)) {
+                    visit(element);
                 }
                 
-                return colors;
+                const rest = document.body ? document.body.getElementsByTagName('*') : [];
+                let sampled = 0;
+                for (let i = 0; i < rest.length && sampled < maxSampledElements; i++) {
+                    if (!visited.has(rest[i])) {
+                        visit(rest[i]);
+                        sampled++;
+                    }
+                }
+                
+                return {
+                    fonts: Array.from(fontFamilies),
+                    textColors: Object.fromEntries(colors.textColors),
+                    backgroundColors: Object.fromEntries(colors.backgroundColors),
+                    borderColors: Object.fromEntries(colors.borderColors),
+                    linkColors: Object.fromEntries(colors.linkColors)
+                };
             }
             """
             
-            colors = await page.evaluate(color_extraction_script)
-            self.logger.info(f"Extracted colors: {len(colors['textColors'])} text, "
-                           f"{len(colors['backgroundColors'])} background, "
-                           f"{len(colors['linkColors'])} link")
-            return colors
+            result = await page.evaluate(extraction_script)
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Extracted %d font families", len(result['fonts']))
+                self.logger.info("Extracted unique colors: %d text, %d background, %d link",
+                                 len(result['textColors']), len(result['backgroundColors']),
+                                 len(result['linkColors']))
+            return result
             
         except Exception as e:
-            self.logger.error(f"Error extracting colors: {str(e)}")
+            self.logger.error("Error extracting fonts and colors: %s", e)
             return {
-                "textColors": ["rgb(51, 51, 51)"],
-                "backgroundColors": ["rgb(255, 255, 255)"],
-                "borderColors": [],
-                "linkColors": ["rgb(0, 102, 204)"]
+                "fonts": ["Arial", "sans-serif"],
+                "textColors": {"rgb(51, 51, 51)": 1},
+                "backgroundColors": {"rgb(255, 255, 255)": 1},
+                "borderColors": {},
+                "linkColors": {"rgb(0, 102, 204)": 1},
+                "fallback": True
             }
     
     def _process_fonts(self, fonts: List[str]) -> Dict[str, List[str]]:
         """Process and rank extracted fonts"""
         try:
-            # Filter out generic font families and system fonts
-            generic_fonts = {'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy', 'system-ui'}
-            system_fonts = {
-                'Arial', 'Helvetica', 'Times', 'Courier', 'Verdana', 'Georgia', 
-                'Palatino', 'Garamond', 'Bookman', 'Comic Sans MS', 'Trebuchet MS', 
-                'Arial Black', 'Impact'
-            }
-            
-            # Prioritize custom/web fonts over system fonts
-            custom_fonts = []
-            fallback_fonts = []
-            
-            for font in fonts:
-                if font.lower() not in generic_fonts:
-                    if font in system_fonts:
-                        fallback_fonts.append(font)
-                    else:
-                        custom_fonts.append(font)
-            
-            # Use custom fonts first, then fallback to system fonts
-            final_fonts = custom_fonts[:2] if custom_fonts else fallback_fonts[:2]
-            
-            # Ensure we always have at least 2 fonts
-            if len(final_fonts) < 2:
-                final_fonts.extend(['Helvetica', 'Arial', 'sans-serif'])
-                final_fonts = final_fonts[:2]
-            
-            return {"fonts": final_fonts}
-            
+            return {"fonts": list(rank_fonts(tuple(fonts)))}
         except Exception as e:
-            self.logger.error(f"Error processing fonts: {str(e)}")
+            self.logger.error("Error processing fonts: %s", e)
             return {"fonts": ["Arial", "sans-serif"]}
     
-    def _process_colors(self, colors: Dict[str, List[str]]) -> Dict[str, str]:
+    def _process_colors(self, colors: Dict[str, Dict[str, int]]) -> Dict[str, str]:
         """Process and rank extracted colors to determine brand colors"""
         try:
-            # Convert all colors to hex format
-            all_colors = []
-            
-            for color_type, color_list in colors.items():
-                for color in color_list:
+            # Convert each bucket to hex once, summing the per-page counts
+            hex_buckets = {}
+            for color_type, bucket in colors.items():
+                hex_counts = Counter()
+                for color, count in bucket.items():
                     hex_color = self._convert_to_hex(color)
                     if hex_color:
-                        all_colors.append(hex_color)
+                        hex_counts[hex_color] += count
+                hex_buckets[color_type] = hex_counts
             
-            color_counts = Counter(all_colors)
+            color_counts = Counter()
+            for hex_counts in hex_buckets.values():
+                color_counts.update(hex_counts)
             
             # Remove very common colors (white, black, transparent)
             excluded_colors = {'#FFFFFF', '#000000', '#TRANSPARENT'}
-            filtered_colors = {color: count for color, count in color_counts.items() 
-                             if color not in excluded_colors}
+            filtered_colors = Counter({color: count for color, count in color_counts.items() 
+                                       if color not in excluded_colors})
             
-            # Get most common colors
-            most_common = list(filtered_colors.keys())[:10] if filtered_colors else ['#333333']
+            # Get most common colors, merging near-duplicate shades first
+            most_common = self._rank_color_clusters(filtered_colors)[:10] or ['#333333']
             
             # Determine specific color roles
-            background_colors = [self._convert_to_hex(c) for c in colors.get('backgroundColors', [])]
-            link_colors = [self._convert_to_hex(c) for c in colors.get('linkColors', [])]
-            
-            bg_color = self._get_most_common_color(background_colors, '#FFFFFF')
-            link_color = self._get_most_common_color(link_colors, '#0066CC')
+            bg_color = self._get_most_common_color(hex_buckets.get('backgroundColors', {}), '#FFFFFF')
+            link_color = self._get_most_common_color(hex_buckets.get('linkColors', {}), '#0066CC')
             
             primary_color = most_common[0] if most_common else '#333333'
             secondary_color = most_common[1] if len(most_common) > 1 else '#666666'
-            if self._get_contrast_ratio(secondary_color, bg_color) < 3:
+            # Identical colors need no luminance lookup to fail the contrast check
+            if secondary_color == bg_color or self._get_contrast_ratio(secondary_color, bg_color) < 3:
                 secondary_color = '#333333' if bg_color != '#333333' else '#FFFFFF'
             
             return {
@@ -232,7 +320,7 @@ class DOMNaiveExtractor(BaseBrandExtractor, PlaywrightMixin):
             }
             
         except Exception as e:
-            self.logger.error(f"Error processing colors: {str(e)}")
+            self.logger.error("Error processing colors: %s", e)
             return {
                 "primaryColor": "#333333",
                 "secondaryColor": "#666666",
@@ -240,56 +328,56 @@ class DOMNaiveExtractor(BaseBrandExtractor, PlaywrightMixin):
                 "linkColor": "#0066CC"
             }
     
-    def _convert_to_hex(self, color: str) -> str:
-        """Convert various color formats to hex"""
-        try:
-            color = color.strip()
-            
-            # Already hex
-            if color.startswith('#'):
-                return color.upper()
-            
-            # RGB format
-            if color.startswith('rgb'):
-                # Extract numbers from rgb(r, g, b) or rgba(r, g, b, a)
-                numbers = re.findall(r'\d+', color)
-                if len(numbers) >= 3:
-                    r, g, b = int(numbers[0]), int(numbers[1]), int(numbers[2])
-                    return f"#{r:02X}{g:02X}{b:02X}"
-            
-            # Named colors
+    def _rank_color_clusters(self, color_counts: Counter) -> List[str]:
+        """Cluster colors with count-weighted k-means and rank clusters by total usage"""
+        rgb_rows = []
+        weights = []
+        hex_colors = []
+        for hex_color, count in color_counts.items():
             try:
-                hex_color = webcolors.name_to_hex(color)
-                return hex_color.upper()
-            except ValueError:
-                pass
-            
-            return None
-            
-        except Exception:
-            return None
+                rgb_rows.append([int(hex_color[i:i+2], 16) for i in (1, 3, 5)])
+            except (ValueError, TypeError):
+                continue
+            weights.append(count)
+            hex_colors.append(hex_color)
+        
+        if len(hex_colors) <= _PALETTE_CLUSTERS:
+            return [color for color, _ in color_counts.most_common()]
+        
+        X = np.array(rgb_rows, dtype=np.float64)
+        w = np.array(weights, dtype=np.float64)
+        labels = _weighted_kmeans(X, w, _PALETTE_CLUSTERS)
+        cluster_weights = np.bincount(labels, weights=w, minlength=_PALETTE_CLUSTERS)
+        
+        # Represent each cluster by its most used member so the result is a real page color
+        ranked = []
+        for cluster in np.argsort(-cluster_weights):
+            members = np.flatnonzero(labels == cluster)
+            if len(members):
+                ranked.append(hex_colors[members[np.argmax(w[members])]])
+        return ranked
+    
+    def _convert_to_hex(self, color: str) -> Optional[str]:
+        """Convert various color formats to hex"""
+        return _convert_to_hex_cached(color)
     
-    def _get_most_common_color(self, color_list: List[str], default: str) -> str:
-        """Get the most common color from a list"""
-        filtered_colors = [c for c in color_list if c and c != '#FFFFFF' and c != '#000000']
+    def _get_most_common_color(self, color_counts: Dict[str, int], default: str) -> str:
+        """Get the most common color from a color -> count mapping"""
+        filtered_colors = Counter({c: n for c, n in color_counts.items() 
+                                   if c and c != '#FFFFFF' and c != '#000000'})
         if not filtered_colors:
             return default
         
-        color_counts = Counter(filtered_colors)
-        return color_counts.most_common(1)[0][0] if color_counts else default
+        return filtered_colors.most_common(1)[0][0]
     
     def _get_contrast_ratio(self, color1: str, color2: str) -> float:
         """Calculate contrast ratio between two colors"""
         try:
             def luminance(hex_color):
-                # Convert hex to RGB
+                # Convert hex to RGB and look up relative luminance
                 hex_color = hex_color.lstrip('#')
-                rgb = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                
-                # Convert to relative luminance
-                rgb_norm = [c / 255.0 for c in rgb]
-                rgb_linear = [c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4 for c in rgb_norm]
-                return 0.2126 * rgb_linear[0] + 0.7152 * rgb_linear[1] + 0.0722 * rgb_linear[2]
+                r, g, b = (int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+                return float(_LUM_R[r] + _LUM_G[g] + _LUM_B[b])
             
             lum1 = luminance(color1)
             lum2 = luminance(color2)
@@ -1,35 +1,162 @@
 from typing import Dict, List, Any, Optional
-from openai import OpenAI
-from .base import BaseBrandExtractor, BrandColors, ExtractionResult, PlaywrightMixin
+from utils import CSS_PROMPT_TEMPLATE
+from .base import (BaseBrandExtractor, BrandColors, ExtractionResult, FALLBACK_BRAND_COLORS,
+                   PlaywrightMixin, cache_brand_colors, get_cached_brand_colors, get_openai_client,
+                   llm_cache_key, llm_request_slot, parse_font_families, rank_fonts)
+
+# Single-pass page script: fonts, inline color elements, key-element computed styles, CSS color rules
+_EXTRACT_ALL_SCRIPT = """
+() => {
+    const fontFamilies = new Set();
+    const colorElements = [];
+    const selectors = [
+        'h1, h2, h3, h4, h5, h6',
+        'a',
+        'button',
+        '.btn, [class*="button"]',
+        '[class*="primary"], [class*="secondary"]',
+        'nav',
+        'header',
+        'footer',
+        '.logo, [class*="logo"]',
+        '[class*="brand"]'
+    ];
+    // Only a slice of each list reaches the prompt (20/20/30), so stop collecting
+    // at twice that instead of serializing every match back to Python
+    const maxColorRules = 40;
+    const maxColorElements = 40;
+    const maxComputedStyles = 60;
+    // Computed styles are grouped per selector to keep the original ordering
+    const computedBySelector = selectors.map(() => []);
+
+    // Single lazy walk over the DOM for fonts, inline colors and key-element styles,
+    // bounded so very large pages do not style every node
+    const maxWalkedElements = 5000;
+    const root = document.body || document.documentElement;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+    for (let element = root, walked = 0; element && walked < maxWalkedElements; element = walker.nextNode(), walked++) {
+        const computedStyle = window.getComputedStyle(element);
+
+        // Raw values only; they are split into families in Python
+        fontFamilies.add(computedStyle.fontFamily);
+
+        // Elements with inline color styles or color-related attributes
+        const style = element.getAttribute('style') || '';
+        const color = element.getAttribute('color') || '';
+        const bgcolor = element.getAttribute('bgcolor') || '';
+        if (colorElements.length < maxColorElements && (style.includes('color') || color || bgcolor)) {
+            colorElements.push({
+                tagName: element.tagName.toLowerCase(),
+                className: element.className || '',
+                id: element.id || '',
+                style: style,
+                color: color,
+                bgcolor: bgcolor
+            });
+        }
+
+        // Computed styles for key elements, limited to 10 per selector
+        for (let i = 0; i < selectors.length; i++) {
+            if (computedBySelector[i].length < 10 && element.matches(selectors[i])) {
+                computedBySelector[i].push({
+                    selector: selectors[i],
+                    tagName: element.tagName.toLowerCase(),
+                    className: element.className || '',
+                    id: element.id || '',
+                    color: computedStyle.color,
+                    backgroundColor: computedStyle.backgroundColor,
+                    borderColor: computedStyle.borderColor,
+                    fontFamily: computedStyle.fontFamily
+                });
+            }
+        }
+    }
+
+    // CSS rules that contain color properties
+    const colorRules = [];
+    const seenRules = new Set();
+    for (let sheet of Array.from(document.styleSheets)) {
+        if (colorRules.length >= maxColorRules) {
+            break;
+        }
+        try {
+            const rules = Array.from(sheet.cssRules || sheet.rules || []);
+
+            for (let rule of rules) {
+                if (colorRules.length >= maxColorRules) {
+                    break;
+                }
+                const ruleStyle = rule.style;
+                if (ruleStyle) {
+                    const selector = rule.selectorText;
+
+                    // Plain property reads; rule.cssText re-serializes the whole rule
+                    const hasColor = ruleStyle.color || ruleStyle.backgroundColor || ruleStyle.background ||
+                        ruleStyle.borderColor || ruleStyle.fill || ruleStyle.stroke;
+
+                    if (hasColor && selector) {
+                        const color = ruleStyle.color || '';
+                        const backgroundColor = ruleStyle.backgroundColor || '';
+                        // Component libraries repeat identical rules across sheets
+                        const key = selector + '|' + color + '|' + backgroundColor;
+                        if (seenRules.has(key)) {
+                            continue;
+                        }
+                        seenRules.add(key);
+                        colorRules.push({
+                            selector: selector,
+                            color: color,
+                            backgroundColor: backgroundColor,
+                            borderColor: ruleStyle.borderColor || ''
+                        });
+                    }
+                }
+            }
+        } catch (e) {
+            // Skip sheets that can't be accessed (CORS)
+            continue;
+        }
+    }
+
+    return {
+        fonts: Array.from(fontFamilies),
+        cssRules: colorRules,
+        htmlColors: colorElements,
+        computedStyles: computedBySelector.flat().slice(0, maxComputedStyles)
+    };
+}
+"""
 
 
 class CSSLLMExtractor(BaseBrandExtractor, PlaywrightMixin):
     """Extract brand elements using CSS/HTML analysis + LLM"""
     
-    def __init__(self):
+    def __init__(self, model: str = "gpt-4.1-mini"):
         super().__init__("CSS_LLM")
+        # Picking 4 hex values from summarized CSS doesn't need the full-size model
+        self.model = model
     
     async def extract_brand_elements(self, url: str, **kwargs) -> ExtractionResult:
         """Extract brand elements using CSS/HTML + LLM analysis"""
-        page = None
+        context = None
         
         try:
             # Setup browser and navigate
-            page = await self._setup_browser()
-            await page.set_viewport_size({'width': 1920, 'height': 1080})
+            context, page = await self._open_page()
+            # Only the DOM and stylesheets matter for CSS color analysis
+            await self._block_resources(page, ('image', 'media', 'font', 'texttrack'))
             
             self.logger.info(f"Analyzing CSS/HTML for {url}")
             await page.goto(url, wait_until='domcontentloaded', timeout=7000)
             
-            # Extract fonts
-            fonts = await self._extract_fonts(page)
+            # Extract fonts plus CSS and HTML content with color information
+            extracted = await self._extract_all(page)
+            fonts = parse_font_families(extracted["fonts"])
+            css_content = extracted["cssRules"]
+            html_color_content = extracted["htmlColors"]
+            computed_styles = extracted["computedStyles"]
             processed_fonts = self._process_fonts(fonts)
             
-            # Extract CSS and HTML content with color information
-            css_content = await self._extract_css_content(page)
-            html_color_content = await self._extract_html_color_content(page)
-            computed_styles = await self._extract_computed_styles(page)
-            
             # Combine all color information
             color_data = {
                 "css_rules": css_content,
@@ -55,256 +182,73 @@ class CSSLLMExtractor(BaseBrandExtractor, PlaywrightMixin):
             return self._create_error_result(str(e))
         
         finally:
-            await self._cleanup_browser()
-    
-    async def _extract_fonts(self, page) -> List[str]:
-        try:
-            font_extraction_script = """
-            () => {
-                const fontFamilies = new Set();
-                const elements = document.querySelectorAll('*');
-                
-                for (let element of elements) {
-                    const computedStyle = window.getComputedStyle(element);
-                    const fontFamily = computedStyle.fontFamily;
-                    
-                    if (fontFamily && fontFamily !== 'inherit') {
-                        const fonts = fontFamily.split(',').map(font => 
-                            font.trim().replace(/['"]/g, '')
-                        );
-                        fonts.forEach(font => {
-                            if (font && !font.includes('inherit') && !font.includes('initial')) {
-                                fontFamilies.add(font);
-                            }
-                        });
-                    }
-                }
-                
-                return Array.from(fontFamilies);
-            }
-            """
-            
-            fonts = await page.evaluate(font_extraction_script)
-            return fonts
-            
-        except Exception as e:
-            self.logger.error(f"Error extracting fonts: {str(e)}")
-            return ["Arial", "sans-serif"]
+            await self._cleanup_browser(context)
     
     def _process_fonts(self, fonts: List[str]) -> Dict[str, List[str]]:
         try:
-            generic_fonts = {'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy', 'system-ui'}
-            system_fonts = {
-                'Arial', 'Helvetica', 'Times', 'Courier', 'Verdana', 'Georgia', 
-                'Palatino', 'Garamond', 'Bookman', 'Comic Sans MS', 'Trebuchet MS', 
-                'Arial Black', 'Impact'
-            }
-            
-            custom_fonts = []
-            fallback_fonts = []
-            
-            for font in fonts:
-                if font.lower() not in generic_fonts:
-                    if font in system_fonts:
-                        fallback_fonts.append(font)
-                    else:
-                        custom_fonts.append(font)
-            
-            final_fonts = custom_fonts[:2] if custom_fonts else fallback_fonts[:2]
-            
-            if len(final_fonts) < 2:
-                final_fonts.extend(['Helvetica', 'Arial', 'sans-serif'])
-                final_fonts = final_fonts[:2]
-            
-            return {"fonts": final_fonts}
-            
+            return {"fonts": list(rank_fonts(tuple(fonts)))}
         except Exception as e:
             self.logger.error(f"Error processing fonts: {str(e)}")
             return {"fonts": ["Arial", "sans-serif"]}
     
-    async def _extract_css_content(self, page) -> List[Dict[str, str]]:
-        """Extract CSS rules that contain color properties"""
-        try:
-            css_extraction_script = """
-            () => {
-                const colorRules = [];
-                const sheets = Array.from(document.styleSheets);
-                
-                for (let sheet of sheets) {
-                    try {
-                        const rules = Array.from(sheet.cssRules || sheet.rules || []);
-                        
-                        for (let rule of rules) {
-                            if (rule.style) {
-                                const cssText = rule.cssText;
-                                const selector = rule.selectorText;
-                                
-                                // Check if rule contains color properties
-                                const colorProps = ['color', 'background-color', 'background', 'border-color', 'fill', 'stroke'];
-                                let hasColor = false;
-                                
-                                for (let prop of colorProps) {
-                                    if (rule.style[prop] || cssText.includes(prop + ':')) {
-                                        hasColor = true;
-                                        break;
-                                    }
-                                }
-                                
-                                if (hasColor && selector) {
-                                    colorRules.push({
-                                        selector: selector,
-                                        cssText: cssText,
-                                        color: rule.style.color || '',
-                                        backgroundColor: rule.style.backgroundColor || '',
-                                        borderColor: rule.style.borderColor || ''
-                                    });
-                                }
-                            }
-                        }
-                    } catch (e) {
-                        // Skip sheets that can't be accessed (CORS)
-                        continue;
-                    }
-                }
-                
-                return colorRules;
-            }
-            """
-            
-            css_rules = await page.evaluate(css_extraction_script)
-            self.logger.info(f"Extracted {len(css_rules)} CSS color rules")
-            return css_rules
-            
-        except Exception as e:
-            self.logger.error(f"Error extracting CSS content: {str(e)}")
-            return []
-    
-    async def _extract_html_color_content(self, page) -> List[Dict[str, str]]:
-        """Extract HTML elements with inline color styles or color-related attributes"""
+    async def _extract_all(self, page) -> Dict[str, List[Any]]:
+        """Extract fonts, CSS color rules, inline color elements and computed styles in one script"""
         try:
-            html_extraction_script = """
-            () => {
-                const colorElements = [];
-                const elements = document.querySelectorAll('*[style], *[color], *[bgcolor]');
-                
-                for (let element of elements) {
-                    const style = element.getAttribute('style') || '';
-                    const color = element.getAttribute('color') || '';
-                    const bgcolor = element.getAttribute('bgcolor') || '';
-                    const tagName = element.tagName.toLowerCase();
-                    const className = element.className || '';
-                    const id = element.id || '';
-                    
-                    // Check if element has color-related attributes or styles
-                    if (style.includes('color') || color || bgcolor) {
-                        colorElements.push({
-                            tagName: tagName,
-                            className: className,
-                            id: id,
-                            style: style,
-                            color: color,
-                            bgcolor: bgcolor,
-                            text: element.textContent ? element.textContent.substring(0, 100) : ''
-                        });
-                    }
-                }
-                
-                return colorElements;
-            }
-            """
-            
-            html_elements = await page.evaluate(html_extraction_script)
-            self.logger.info(f"Extracted {len(html_elements)} HTML elements with color attributes")
-            return html_elements
+            result = await page.evaluate(_EXTRACT_ALL_SCRIPT)
+            self.logger.info(f"Extracted {len(result['cssRules'])} CSS color rules, "
+                             f"{len(result['htmlColors'])} HTML elements with color attributes, "
+                             f"{len(result['computedStyles'])} computed styles")
+            return result
             
         except Exception as e:
-            self.logger.error(f"Error extracting HTML color content: {str(e)}")
-            return []
-    
-    async def _extract_computed_styles(self, page) -> List[Dict[str, str]]:
-        """Extract computed styles for key elements (headers, buttons, links, etc.)"""
-        try:
-            computed_styles_script = """
-            () => {
-                const computedStyles = [];
-                const selectors = [
-                    'h1, h2, h3, h4, h5, h6',
-                    'a',
-                    'button',
-                    '.btn, [class*="button"]',
-                    '[class*="primary"], [class*="secondary"]',
-                    'nav',
-                    'header',
-                    'footer',
-                    '.logo, [class*="logo"]',
-                    '[class*="brand"]'
-                ];
-                
-                for (let selector of selectors) {
-                    const elements = document.querySelectorAll(selector);
-                    
-                    for (let i = 0; i < Math.min(elements.length, 10); i++) { // Limit to 10 per selector
-                        const element = elements[i];
-                        const computedStyle = window.getComputedStyle(element);
-                        
-                        computedStyles.push({
-                            selector: selector,
-                            tagName: element.tagName.toLowerCase(),
-                            className: element.className || '',
-                            id: element.id || '',
-                            color: computedStyle.color,
-                            backgroundColor: computedStyle.backgroundColor,
-                            borderColor: computedStyle.borderColor,
-                            fontFamily: computedStyle.fontFamily,
-                            text: element.textContent ? element.textContent.substring(0, 50) : ''
-                        });
-                    }
-                }
-                
-                return computedStyles;
+            self.logger.error(f"Error extracting page content: {str(e)}")
+            return {
+                "fonts": ["Arial", "sans-serif"],
+                "cssRules": [],
+                "htmlColors": [],
+                "computedStyles": []
             }
-            """
-            
-            computed_styles = await page.evaluate(computed_styles_script)
-            self.logger.info(f"Extracted {len(computed_styles)} computed styles")
-            return computed_styles
-            
-        except Exception as e:
-            self.logger.error(f"Error extracting computed styles: {str(e)}")
-            return []
     
     async def _analyze_colors_with_llm(self, color_data: Dict[str, Any]) -> BrandColors:
+        # Nothing for the model to pick from (CORS-locked sheets, blank SPA shell);
+        # skip the round-trip and return the default palette directly
+        if not (color_data["css_rules"] or color_data["html_colors"] or color_data["computed_styles"]):
+            self.logger.info("No color data extracted, skipping LLM analysis")
+            return FALLBACK_BRAND_COLORS
+        
         try:
             CSS_LLM_PROMPT = self._create_css_analysis_prompt(color_data)
             
-            client = OpenAI()
-
-            response = client.responses.parse(
-                model="gpt-4.1",
-                temperature=0.7,
-                input=[
-                {
-                    "role": "user",
-                    "content": [
-                        { "type": "input_text", "text": CSS_LLM_PROMPT },
-                    ],
-                },
-            ],
-                text_format=BrandColors,
-            )
+            # The prompt holds exactly the summarized data the model sees
+            cache_key = llm_cache_key(self.model, CSS_LLM_PROMPT)
+            cached = get_cached_brand_colors(cache_key)
+            if cached is not None:
+                self.logger.info("Using cached LLM analysis")
+                return cached
+            
+            async with llm_request_slot():
+                response = await get_openai_client().responses.parse(
+                    model=self.model,
+                    temperature=0,
+                    input=[
+                    {
+                        "role": "user",
+                        "content": [
+                            { "type": "input_text", "text": CSS_LLM_PROMPT },
+                        ],
+                    },
+                ],
+                    text_format=BrandColors,
+                )
 
             self.logger.info(f"LLM Usage: {response.usage}")
 
+            cache_brand_colors(cache_key, response.output_parsed)
             return response.output_parsed
             
         except Exception as e:
             self.logger.error(f"Error in LLM analysis: {str(e)}")
-            return BrandColors(
-                primaryColor="#333333",
-                secondaryColor="#666666",
-                backgroundColor="#FFFFFF",
-                linkColor="#0066CC"
-            )
+            return FALLBACK_BRAND_COLORS
     
     def _create_css_analysis_prompt(self, color_data: Dict[str, Any]) -> str:
         
@@ -321,48 +265,8 @@ class CSSLLMExtractor(BaseBrandExtractor, PlaywrightMixin):
         for style in color_data["computed_styles"][:30]:  # Limit to top 30 styles
             computed_styles_summary.append(f"Element: {style['tagName']}.{style['className']}, Color: {style['color']}, BG: {style['backgroundColor']}")
         
-        prompt = f"""
-You are a brand color expert analyzing a website's CSS and HTML to extract brand colors.
-
-## CSS Rules with Colors:
-{chr(10).join(css_rules_summary)}
-
-## HTML Elements with Color Attributes:
-{chr(10).join(html_elements_summary)}
-
-## Computed Styles for Key Elements:
-{chr(10).join(computed_styles_summary)}
-
-Based on this CSS and HTML analysis, determine the brand colors:
-
-1. **primaryColor**: The main brand accent color
-   - Look for the most prominent brand color in logos, headers, primary buttons
-   - This should be the color that represents the brand most strongly
-   - Often used in call-to-action buttons, primary navigation, or logo elements
-
-2. **secondaryColor**: Main text color
-   - Look for a secondary accent color used throughout the design
-   - Often complementary to the primary color
-
-3. **backgroundColor**: The main page background color
-   - Identify the dominant background color behind the main content
-   - Usually the lightest (or darkest in dark mode) large-area color
-   - Must have a high contrast ratio with the secondaryColor, since secondaryColor is used for text.
-   - Should be the color that covers the most area in the layout
-
-4. **linkColor**: The color used for hyperlinks
-   - Look for the color used in navigation links, text links, or interactive elements
-   - Often blue, but can be any color that indicates clickable text
-   - If unclear, use the color most commonly applied to inline text links
-
-Guidelines:
-- Focus on colors that appear in multiple important UI elements
-- Prioritize colors from branding elements (logos, headers, navigation)
-- Avoid generic colors unless they're clearly intentional brand choices
-- Ensure colors have good contrast with the background
-- Return all colors in uppercase HEX format (e.g., #FF5733)
-
-Return your analysis as a JSON object with exactly these keys: primaryColor, secondaryColor, backgroundColor, linkColor
-"""
-        
-        return prompt
+        return CSS_PROMPT_TEMPLATE.format(
+            css_rules="\n".join(css_rules_summary),
+            html_elements="\n".join(html_elements_summary),
+            computed_styles="\n".join(computed_styles_summary)
+        )
@@ -1,11 +1,40 @@
+import asyncio
 import time
 from typing import Dict, List
 from google import genai
 from google.genai import types
-import base64
-from openai import OpenAI
+import io
+from PIL import Image
 from utils import IMAGE_PROMPT
-from .base import BaseBrandExtractor, BrandColors, ExtractionResult, PlaywrightMixin
+from .base import (BaseBrandExtractor, BrandColors, ExtractionResult, FALLBACK_BRAND_COLORS,
+                   PlaywrightMixin, cache_brand_colors, get_cached_brand_colors, get_openai_client,
+                   jpeg_data_url, llm_cache_key, llm_request_slot, parse_font_families,
+                   rank_fonts)
+
+# Bounding box for the image sent to the vision model (width, height)
+LLM_IMAGE_MAX_SIZE = (1024, 4096)
+
+
+_FONT_FAMILIES_SCRIPT = """
+() => {
+    // Collect the distinct raw font-family values; parsing happens in Python.
+    // Elements are walked lazily and the walk stops once no new values appear.
+    const maxElements = 5000;
+    const maxStagnant = 500;
+    const root = document.body || document.documentElement;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+    const fontFamilies = new Set([window.getComputedStyle(root).fontFamily]);
+    let walked = 1;
+    let stagnant = 0;
+    while (walked < maxElements && stagnant < maxStagnant && walker.nextNode()) {
+        const before = fontFamilies.size;
+        fontFamilies.add(window.getComputedStyle(walker.currentNode).fontFamily);
+        stagnant = fontFamilies.size === before ? stagnant + 1 : 0;
+        walked++;
+    }
+    return Array.from(fontFamilies);
+}
+"""
 
 
 class ScreenshotDirectExtractor(BaseBrandExtractor, PlaywrightMixin):
@@ -24,15 +53,16 @@ class ScreenshotDirectExtractor(BaseBrandExtractor, PlaywrightMixin):
         wait_for_selector = kwargs.get('wait_for_selector')
         wait_timeout = 7000
         
-        page = None
+        context = None
         start_time = time.time()
         timing_info = {}
         
         try:
             # Setup browser
             setup_start = time.time()
-            page = await self._setup_browser()
-            await page.set_viewport_size({'width': viewport_width, 'height': viewport_height})
+            context, page = await self._open_page(viewport_width, viewport_height)
+            # Images and fonts are kept since they appear in the screenshot
+            await self._block_resources(page, ('media', 'texttrack'))
             setup_time = time.time() - setup_start
             timing_info['browser_setup_seconds'] = round(setup_time, 3)
             
@@ -65,13 +95,17 @@ class ScreenshotDirectExtractor(BaseBrandExtractor, PlaywrightMixin):
             screenshot_time = time.time() - screenshot_start
             timing_info['screenshot_capture_seconds'] = round(screenshot_time, 3)
             
-            # Extract fonts (reuse DOM method for font extraction)
-            fonts = await self._extract_fonts(page)
+            # Shrink the screenshot before upload (brand colors survive downscaling);
+            # the PIL work runs in a worker thread while fonts are read from the page
+            fonts, llm_image_bytes = await asyncio.gather(
+                self._extract_fonts(page),
+                asyncio.to_thread(self._downscale_screenshot, screenshot_bytes)
+            )
             processed_fonts = self._process_fonts(fonts)
             
             # LLM analysis of raw screenshot
             llm_start = time.time()
-            brand_colors = await self._analyze_screenshot_with_llm(screenshot_bytes, url)
+            brand_colors = await self._analyze_screenshot_with_llm(llm_image_bytes, url)
             llm_time = time.time() - llm_start
             timing_info['llm_analysis_seconds'] = round(llm_time, 3)
             
@@ -81,6 +115,7 @@ class ScreenshotDirectExtractor(BaseBrandExtractor, PlaywrightMixin):
             
             metadata = {
                 "screenshot_size_bytes": len(screenshot_bytes),
+                "llm_image_size_bytes": len(llm_image_bytes),
                 "timing": timing_info,
                 "screenshot_options": {
                     "viewport_width": viewport_width,
@@ -99,38 +134,13 @@ class ScreenshotDirectExtractor(BaseBrandExtractor, PlaywrightMixin):
             return self._create_error_result(str(e), {"timing": timing_info})
         
         finally:
-            await self._cleanup_browser()
+            await self._cleanup_browser(context)
     
     async def _extract_fonts(self, page) -> List[str]:
         """Extract font families from the page using JavaScript (reused from Method 1)"""
         try:
-            font_extraction_script = """
-            () => {
-                const fontFamilies = new Set();
-                const elements = document.querySelectorAll('*');
-                
-                for (let element of elements) {
-                    const computedStyle = window.getComputedStyle(element);
-                    const fontFamily = computedStyle.fontFamily;
-                    
-                    if (fontFamily && fontFamily !== 'inherit') {
-                        const fonts = fontFamily.split(',').map(font => 
-                            font.trim().replace(/['"]/g, '')
-                        );
-                        fonts.forEach(font => {
-                            if (font && !font.includes('inherit') && !font.includes('initial')) {
-                                fontFamilies.add(font);
-                            }
-                        });
-                    }
-                }
-                
-                return Array.from(fontFamilies);
-            }
-            """
-            
-            fonts = await page.evaluate(font_extraction_script)
-            return fonts
+            font_family_values = await page.evaluate(_FONT_FAMILIES_SCRIPT)
+            return parse_font_families(font_family_values)
             
         except Exception as e:
             self.logger.error(f"Error extracting fonts: {str(e)}")
@@ -139,68 +149,58 @@ class ScreenshotDirectExtractor(BaseBrandExtractor, PlaywrightMixin):
     def _process_fonts(self, fonts: List[str]) -> Dict[str, List[str]]:
         """Process and rank extracted fonts (reused from Method 1)"""
         try:
-            generic_fonts = {'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy', 'system-ui'}
-            system_fonts = {
-                'Arial', 'Helvetica', 'Times', 'Courier', 'Verdana', 'Georgia', 
-                'Palatino', 'Garamond', 'Bookman', 'Comic Sans MS', 'Trebuchet MS', 
-                'Arial Black', 'Impact'
-            }
-            
-            custom_fonts = []
-            fallback_fonts = []
-            
-            for font in fonts:
-                if font.lower() not in generic_fonts:
-                    if font in system_fonts:
-                        fallback_fonts.append(font)
-                    else:
-                        custom_fonts.append(font)
-            
-            final_fonts = custom_fonts[:2] if custom_fonts else fallback_fonts[:2]
-            
-            if len(final_fonts) < 2:
-                final_fonts.extend(['Helvetica', 'Arial', 'sans-serif'])
-                final_fonts = final_fonts[:2]
-            
-            return {"fonts": final_fonts}
-            
+            return {"fonts": list(rank_fonts(tuple(fonts)))}
         except Exception as e:
             self.logger.error(f"Error processing fonts: {str(e)}")
             return {"fonts": ["Arial", "sans-serif"]}
     
+    def _downscale_screenshot(self, screenshot_bytes: bytes) -> bytes:
+        """Resize the screenshot to at most LLM_IMAGE_MAX_SIZE and re-encode it as a smaller JPEG"""
+        try:
+            img = Image.open(io.BytesIO(screenshot_bytes))
+            img.thumbnail(LLM_IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+            output_stream = io.BytesIO()
+            img.convert("RGB").save(output_stream, format='JPEG', quality=80, optimize=True)
+            return output_stream.getvalue()
+            
+        except Exception as e:
+            self.logger.error(f"Error downscaling screenshot: {str(e)}")
+            return screenshot_bytes
+    
     async def _analyze_screenshot_with_llm(self, screenshot_bytes: bytes, url: str) -> BrandColors:
         """Analyze the screenshot directly using GPT-4.1"""
         try:
-            client = OpenAI()
+            cache_key = llm_cache_key("gpt-4.1", IMAGE_PROMPT, screenshot_bytes)
+            cached = get_cached_brand_colors(cache_key)
+            if cached is not None:
+                self.logger.info("Using cached LLM analysis")
+                return cached
 
-            response = client.responses.parse(
-                model="gpt-4.1",
-                temperature=0.7,
-                input=[
-                {
-                    "role": "user",
-                    "content": [
-                        { "type": "input_text", "text": IMAGE_PROMPT },
-                        {
-                            "type": "input_image",
-                            "image_url": f"data:image/jpeg;base64,{base64.b64encode(screenshot_bytes).decode('utf-8')}",
-                        },
-                    ],
-                }
-            ],
-                text_format=BrandColors,
-            )
+            async with llm_request_slot():
+                response = await get_openai_client().responses.parse(
+                    model="gpt-4.1",
+                    temperature=0.7,
+                    input=[
+                    {
+                        "role": "user",
+                        "content": [
+                            { "type": "input_text", "text": IMAGE_PROMPT },
+                            {
+                                "type": "input_image",
+                                "image_url": jpeg_data_url(screenshot_bytes),
+                            },
+                        ],
+                    }
+                ],
+                    text_format=BrandColors,
+                )
 
             self.logger.info(f"LLM Usage: {response.usage}")
 
+            cache_brand_colors(cache_key, response.output_parsed)
             return response.output_parsed
             
         except Exception as e:
             self.logger.error(f"Error in LLM analysis: {str(e)}")
 
-            return BrandColors(
-                primaryColor="#333333",
-                secondaryColor="#666666",
-                backgroundColor="#FFFFFF",
-                linkColor="#0066CC"
-            )
\ No newline at end of file
+            return FALLBACK_BRAND_COLORS
\ No newline at end of file
@@ -1,13 +1,70 @@
+import asyncio
 import time
-import base64
 import io
-from typing import Dict, List
-from PIL import Image, ImageDraw, ImageFont
-from colorthief import ColorThief
-from openai import OpenAI
-from utils import IMAGE_PALETTE_PROMPT
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from PIL import Image
+from sklearn.cluster import MiniBatchKMeans
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from pydantic import BaseModel
+from utils import IMAGE_PALETTE_BATCH_PREFIX, IMAGE_PALETTE_BATCH_SUFFIX, IMAGE_PALETTE_PROMPT
+
+from .base import (BaseBrandExtractor, BrandColors, ExtractionResult, FALLBACK_BRAND_COLORS,
+                   PlaywrightMixin, get_openai_client, jpeg_data_url, llm_request_slot,
+                   parse_font_families, rank_fonts)
+
+# Bounding box for the screenshot sent to the vision model (width, height);
+# wider images are re-tiled by the model anyway
+LLM_IMAGE_MAX_SIZE = (1024, 4096)
+# Palette images sent to the model in one batched request
+LLM_BATCH_SIZE = 8
+# Bounding box the screenshot is reduced to before clustering; the dominant
+# colors survive the downscale while the pixel count drops ~24x
+_PALETTE_MAX_SIZE = (400, 400)
+# Palette reported when the screenshot can't be decoded or clustered
+_FALLBACK_PALETTE = ("#FF5733", "#33FF57", "#3357FF", "#FFD700", "#800080",
+                     "#FF1493", "#00CED1", "#32CD32", "#FF6347", "#9370DB")
+# Pixels used to fit the palette clusters; the rest are only assigned to them
+_PALETTE_SAMPLE_SIZE = 100_000
+# Rows per distance block when assigning every pixel to its nearest cluster
+_ASSIGN_CHUNK_ROWS = 50_000
+
+
+_FONT_FAMILIES_SCRIPT = """
+() => {
+    // Brand fonts live on a handful of semantic elements, so only those are styled
+    // instead of every node; raw font-family values are parsed in Python.
+    const maxElements = 200;
+    const sampleSelector = 'body, h1, h2, h3, p, a, button, nav, header, [class*="logo"], [class*="brand"]';
+    let elements = Array.from(document.querySelectorAll(sampleSelector)).slice(0, maxElements);
+    if (elements.length === 0) {
+        // Unusual markup (no body or semantic tags): take the first elements in document order
+        const root = document.documentElement;
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+        elements = [root];
+        while (elements.length < maxElements && walker.nextNode()) {
+            elements.push(walker.currentNode);
+        }
+    }
+    const fontFamilies = new Set();
+    for (const element of elements) {
+        fontFamilies.add(window.getComputedStyle(element).fontFamily);
+    }
+    return Array.from(fontFamilies);
+}
+"""
+
+
+def _palette_text(colors: List[str]) -> str:
+    """Render the extracted palette as the text the LLM selects from"""
+    return "Available palette: " + ", ".join(colors)
+
+
+class BrandColorsBatch(BaseModel):
+    # Structured outputs need an object at the root, so the list is wrapped
+    results: List[BrandColors]
+
 
-from .base import BaseBrandExtractor, BrandColors, ExtractionResult, PlaywrightMixin
 class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
     """Extract brand elements using screenshot + color palette + LLM analysis"""
     
@@ -16,7 +73,65 @@ class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
     
     async def extract_brand_elements(self, url: str, **kwargs) -> ExtractionResult:
         """Extract brand elements using screenshot and palette analysis"""
-
+        start_time = time.time()
+        timing_info = {}
+        
+        try:
+            capture = await self._capture(url, timing_info, **kwargs)
+            
+            # LLM analysis
+            llm_start = time.time()
+            brand_colors = await self._analyze_with_llm(capture["llm_image_bytes"], capture["extracted_colors"])
+            timing_info['llm_analysis_seconds'] = round(time.time() - llm_start, 3)
+            
+            return self._create_capture_result(capture, brand_colors, timing_info, start_time)
+            
+        except Exception as e:
+            timing_info['total_process_seconds'] = round(time.time() - start_time, 3)
+            self.logger.error(f"Error during screenshot palette extraction: {str(e)}")
+            return self._create_error_result(str(e), {"timing": timing_info})
+    
+    async def extract_brand_elements_batch(self, urls: List[str], max_concurrency: int = 5,
+                                           **kwargs) -> List[ExtractionResult]:
+        """Extract brand elements for several URLs, sharing one LLM call per group of screenshots"""
+        start_time = time.time()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        timings = [{} for _ in urls]
+        
+        async def _capture_one(url: str, timing_info: Dict[str, float]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._capture(url, timing_info, **kwargs)
+        
+        captures = await asyncio.gather(*[_capture_one(url, timing_info) for url, timing_info in zip(urls, timings)],
+                                        return_exceptions=True)
+        captured = [index for index, capture in enumerate(captures) if not isinstance(capture, BaseException)]
+        
+        llm_start = time.time()
+        # Groups run concurrently; llm_request_slot() bounds in-flight requests and rate
+        groups = [captured[group_start:group_start + LLM_BATCH_SIZE]
+                  for group_start in range(0, len(captured), LLM_BATCH_SIZE)]
+        group_colors = await asyncio.gather(*(
+            self._analyze_batch_with_llm(
+                [(captures[index]["llm_image_bytes"], captures[index]["extracted_colors"]) for index in group])
+            for group in groups))
+        brand_colors = [colors for group_result in group_colors for colors in group_result]
+        llm_time = round(time.time() - llm_start, 3)
+        
+        results = []
+        colors_by_index = dict(zip(captured, brand_colors))
+        for index, (capture, timing_info) in enumerate(zip(captures, timings)):
+            if isinstance(capture, BaseException):
+                timing_info['total_process_seconds'] = round(time.time() - start_time, 3)
+                self.logger.error(f"Error during screenshot palette extraction for {urls[index]}: {str(capture)}")
+                results.append(self._create_error_result(str(capture), {"timing": timing_info}))
+                continue
+            # The LLM time is shared by every page in the batch
+            timing_info['llm_analysis_seconds'] = llm_time
+            results.append(self._create_capture_result(capture, colors_by_index[index], timing_info, start_time))
+        return results
+    
+    async def _capture(self, url: str, timing_info: Dict[str, float], **kwargs) -> Dict[str, Any]:
+        """Screenshot the page, read its fonts and extract its palette; records timings into timing_info"""
         viewport_width = kwargs.get('viewport_width', 1920)
         viewport_height = kwargs.get('viewport_height', 1080)
         quality = kwargs.get('quality', 90)
@@ -24,23 +139,30 @@ class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
         wait_timeout = 15000
         num_colors = kwargs.get('num_colors', 10)
         
-        page = None
-        start_time = time.time()
-        timing_info = {}
-        
+        context = None
         try:
             # Setup browser
             setup_start = time.time()
-            page = await self._setup_browser()
-            await page.set_viewport_size({'width': viewport_width, 'height': viewport_height})
+            context, page = await self._open_page(viewport_width, viewport_height)
+            # Media, web fonts and sockets routinely take seconds and don't change the palette
+            await self._block_resources(page, ('media', 'font', 'websocket'))
             setup_time = time.time() - setup_start
             timing_info['browser_setup_seconds'] = round(setup_time, 3)
             
             nav_start = time.time()
             self.logger.info(f"Taking screenshot with palette for {url}")
+            navigation_failed = False
             try:
-                await page.goto(url, wait_until='domcontentloaded', timeout=wait_timeout)
+                await page.goto(url, wait_until='commit', timeout=wait_timeout)
+                # Above-the-fold pixels are usually painted well before DOMContentLoaded
+                # on ad-heavy pages, so only wait briefly for the network to settle
+                try:
+                    await page.wait_for_load_state('networkidle', timeout=3000)
+                except PlaywrightTimeoutError:
+                    self.logger.info(f"Network still busy on {url}, taking screenshot anyway")
             except Exception as e:
+                # The screenshot is still taken, but shows whatever (possibly an error page) loaded
+                navigation_failed = True
                 self.logger.warning(f"Timeout navigating to {url}: {str(e)}")
             nav_time = time.time() - nav_start
             timing_info['page_navigation_seconds'] = round(nav_time, 3)
@@ -66,38 +188,21 @@ class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
             screenshot_time = time.time() - screenshot_start
             timing_info['screenshot_capture_seconds'] = round(screenshot_time, 3)
             
-            # Extract fonts (reuse DOM method for font extraction)
-            fonts = await self._extract_fonts(page)
-            processed_fonts = self._process_fonts(fonts)
-            
-            # Extract colors from screenshot
-            color_start = time.time()
-            extracted_colors = self._extract_colors_from_screenshot(screenshot_bytes, num_colors)
-            color_time = time.time() - color_start
-            timing_info['color_extraction_seconds'] = round(color_time, 3)
-            
-            # Create palette image
-            palette_start = time.time()
-            combined_image_bytes = self._create_palette_image(screenshot_bytes, extracted_colors)
-            palette_time = time.time() - palette_start
-            timing_info['palette_creation_seconds'] = round(palette_time, 3)
-            
-            # LLM analysis
-            llm_start = time.time()
-            brand_colors = await self._analyze_with_llm(combined_image_bytes)
-            llm_time = time.time() - llm_start
-            timing_info['llm_analysis_seconds'] = round(llm_time, 3)
-            
-            # Create metadata
-            total_time = time.time() - start_time
-            timing_info['total_process_seconds'] = round(total_time, 3)
+            # Fonts are read from the live page while the CPU-bound palette work
+            # runs in a worker thread, so the two overlap
+            fonts, (extracted_colors, llm_image_bytes, palette_timing) = await asyncio.gather(
+                self._extract_fonts(page),
+                asyncio.to_thread(self._build_palette, screenshot_bytes, num_colors)
+            )
+            timing_info.update(palette_timing)
             
-            metadata = {
+            return {
+                "fonts": self._process_fonts(fonts)["fonts"],
                 "extracted_colors": extracted_colors,
-                "combined_image_size_bytes": len(combined_image_bytes),
+                "llm_image_bytes": llm_image_bytes,
                 "original_screenshot_size_bytes": len(screenshot_bytes),
-                "timing": timing_info,
                 "num_colors": num_colors,
+                "navigation_failed": navigation_failed,
                 "screenshot_options": {
                     "viewport_width": viewport_width,
                     "viewport_height": viewport_height,
@@ -105,48 +210,31 @@ class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
                     "quality": quality
                 }
             }
-            
-            return self._create_success_result(brand_colors, processed_fonts["fonts"], metadata)
-            
-        except Exception as e:
-            total_time = time.time() - start_time
-            timing_info['total_process_seconds'] = round(total_time, 3)
-            self.logger.error(f"Error during screenshot palette extraction: {str(e)}")
-            return self._create_error_result(str(e), {"timing": timing_info})
         
         finally:
-            await self._cleanup_browser()
+            await self._cleanup_browser(context)
+    
+    def _create_capture_result(self, capture: Dict[str, Any], brand_colors: BrandColors,
+                               timing_info: Dict[str, float], start_time: float) -> ExtractionResult:
+        timing_info['total_process_seconds'] = round(time.time() - start_time, 3)
+        
+        metadata = {
+            "extracted_colors": capture["extracted_colors"],
+            "llm_image_size_bytes": len(capture["llm_image_bytes"]),
+            "original_screenshot_size_bytes": capture["original_screenshot_size_bytes"],
+            "timing": timing_info,
+            "num_colors": capture["num_colors"],
+            "screenshot_options": capture["screenshot_options"]
+        }
+        
+        fallback = capture["navigation_failed"] or tuple(capture["extracted_colors"]) == _FALLBACK_PALETTE
+        return self._create_success_result(brand_colors, capture["fonts"], metadata, fallback)
     
     async def _extract_fonts(self, page) -> List[str]:
-        """Extract font families from the page using JavaScript (reused from Method 1)"""
+        """Extract font families from a sample of brand-bearing elements"""
         try:
-            font_extraction_script = """
-            () => {
-                const fontFamilies = new Set();
-                const elements = document.querySelectorAll('*');
-                
-                for (let element of elements) {
-                    const computedStyle = window.getComputedStyle(element);
-                    const fontFamily = computedStyle.fontFamily;
-                    
-                    if (fontFamily && fontFamily !== 'inherit') {
-                        const fonts = fontFamily.split(',').map(font => 
-                            font.trim().replace(/['"]/g, '')
-                        );
-                        fonts.forEach(font => {
-                            if (font && !font.includes('inherit') && !font.includes('initial')) {
-                                fontFamilies.add(font);
-                            }
-                        });
-                    }
-                }
-                
-                return Array.from(fontFamilies);
-            }
-            """
-            
-            fonts = await page.evaluate(font_extraction_script)
-            return fonts
+            font_families = await page.evaluate(_FONT_FAMILIES_SCRIPT)
+            return parse_font_families(font_families)
             
         except Exception as e:
             self.logger.error(f"Error extracting fonts: {str(e)}")
@@ -155,52 +243,69 @@ class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
     def _process_fonts(self, fonts: List[str]) -> Dict[str, List[str]]:
         """Process and rank extracted fonts (reused from Method 1)"""
         try:
-            generic_fonts = {'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy', 'system-ui'}
-            system_fonts = {
-                'Arial', 'Helvetica', 'Times', 'Courier', 'Verdana', 'Georgia', 
-                'Palatino', 'Garamond', 'Bookman', 'Comic Sans MS', 'Trebuchet MS', 
-                'Arial Black', 'Impact'
-            }
-            
-            custom_fonts = []
-            fallback_fonts = []
-            
-            for font in fonts:
-                if font.lower() not in generic_fonts:
-                    if font in system_fonts:
-                        fallback_fonts.append(font)
-                    else:
-                        custom_fonts.append(font)
-            
-            final_fonts = custom_fonts[:2] if custom_fonts else fallback_fonts[:2]
-            
-            if len(final_fonts) < 2:
-                final_fonts.extend(['Helvetica', 'Arial', 'sans-serif'])
-                final_fonts = final_fonts[:2]
-            
-            return {"fonts": final_fonts}
-            
+            return {"fonts": list(rank_fonts(tuple(fonts)))}
         except Exception as e:
             self.logger.error(f"Error processing fonts: {str(e)}")
             return {"fonts": ["Arial", "sans-serif"]}
     
-    def _extract_colors_from_screenshot(self, screenshot_bytes: bytes, num_colors: int = 10) -> List[str]:
-        """Extract top colors from screenshot using ColorThief"""
+    def _build_palette(self, screenshot_bytes: bytes, num_colors: int) -> Tuple[List[str], bytes, Dict[str, float]]:
+        """Extract the screenshot colors and shrink the screenshot for the LLM (blocking)"""
+        timing_info = {}
+        
+        # Decode once at the LLM size; the clustering thumbnail is derived from the same image
+        downscale_start = time.time()
+        llm_image = None
+        llm_image_bytes = screenshot_bytes
         try:
-            # Create a BytesIO object from the screenshot bytes
-            image_stream = io.BytesIO(screenshot_bytes)
+            img = Image.open(io.BytesIO(screenshot_bytes))
+            img.thumbnail(LLM_IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+            llm_image = img.convert("RGB")
+            llm_image_bytes = self._encode_llm_image(llm_image)
+        except Exception as e:
+            self.logger.error(f"Error downscaling screenshot: {str(e)}")
+        timing_info['image_downscale_seconds'] = round(time.time() - downscale_start, 3)
+        
+        color_start = time.time()
+        if llm_image is not None:
+            extracted_colors = self._extract_colors_from_screenshot(llm_image, num_colors)
+        else:
+            # Nothing decodable to cluster
+            extracted_colors = list(_FALLBACK_PALETTE)
+        timing_info['color_extraction_seconds'] = round(time.time() - color_start, 3)
+        
+        return extracted_colors, llm_image_bytes, timing_info
+    
+    def _extract_colors_from_screenshot(self, screenshot: Image.Image, num_colors: int = 10) -> List[str]:
+        """Extract the dominant colors of the decoded screenshot with k-means, most common first"""
+        try:
+            # thumbnail() resizes in place and the caller still needs its image
+            img = screenshot.copy()
+            img.thumbnail(_PALETTE_MAX_SIZE, Image.Resampling.BILINEAR)
+            pixels = np.asarray(img.convert("RGB"), dtype=np.float32).reshape(-1, 3)
             
-            # Use ColorThief to extract colors
-            color_thief = ColorThief(image_stream)
+            # Fit on a fixed-seed sample so results are repeatable for the same screenshot
+            rng = np.random.default_rng(0)
+            if len(pixels) > _PALETTE_SAMPLE_SIZE:
+                sample = pixels[rng.choice(len(pixels), _PALETTE_SAMPLE_SIZE, replace=False)]
+            else:
+                sample = pixels
+            n_clusters = min(num_colors, len(np.unique(sample, axis=0)))
+            kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=3, batch_size=4096,
+                                     max_iter=50, random_state=0).fit(sample)
+            centers = kmeans.cluster_centers_.astype(np.float32)
             
-            # Get the dominant colors as RGB tuples
-            dominant_colors = color_thief.get_palette(color_count=num_colors, quality=1)
+            # Weight clusters by full-resolution pixel counts; |p-c|^2 = |p|^2 - 2p.c + |c|^2
+            # keeps the distance math in BLAS, and chunking bounds the distance matrix
+            center_norms = (centers ** 2).sum(axis=1)
+            counts = np.zeros(n_clusters, dtype=np.int64)
+            for start in range(0, len(pixels), _ASSIGN_CHUNK_ROWS):
+                chunk = pixels[start:start + _ASSIGN_CHUNK_ROWS]
+                labels = np.argmin(center_norms - 2 * chunk @ centers.T, axis=1)
+                counts += np.bincount(labels, minlength=n_clusters)
             
-            # Convert RGB tuples to hex codes
-            hex_colors = []
-            for rgb in dominant_colors:
-                hex_color = f"#{rgb[0]:02X}{rgb[1]:02X}{rgb[2]:02X}"
-                hex_colors.append(hex_color)
+            # Most common first; the packed uint8 rows format as hex in C
+            ranked = np.clip(np.rint(centers[np.argsort(-counts, kind='stable')]), 0, 255).astype(np.uint8)
+            hex_colors = list(dict.fromkeys("#" + row.tobytes().hex().upper() for row in ranked))
             
             self.logger.info(f"Extracted {len(hex_colors)} colors: {hex_colors}")
             return hex_colors
@@ -208,86 +313,71 @@ class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
         except Exception as e:
             self.logger.error(f"Error extracting colors from screenshot: {str(e)}")
             # Return some default colors if extraction fails
-            return ["#FF5733", "#33FF57", "#3357FF", "#FFD700", "#800080", 
-                   "#FF1493", "#00CED1", "#32CD32", "#FF6347", "#9370DB"]
+            return list(_FALLBACK_PALETTE)
     
-    def _create_palette_image(self, screenshot_bytes: bytes, colors: List[str]) -> bytes:
-        """Create a palette strip and combine it with the original screenshot"""
+    def _encode_llm_image(self, img: Image.Image) -> bytes:
+        """Encode the downscaled screenshot as a compact JPEG for upload"""
+        output_stream = io.BytesIO()
+        img.save(output_stream, format='JPEG', quality=75, optimize=True, progressive=True)
+        return output_stream.getvalue()
+    
+    async def _analyze_batch_with_llm(self, images: List[Tuple[bytes, List[str]]]) -> List[BrandColors]:
+        """Analyze several (screenshot, palette) pairs in one GPT-4.1 request, one result per image in order"""
+        if len(images) == 1:
+            return [await self._analyze_with_llm(*images[0])]
+        
         try:
-            image_stream = io.BytesIO(screenshot_bytes)
-            img = Image.open(image_stream).convert("RGB")
-            width = img.width
-            palette_height = int(img.height * 0.2) 
-            
-            palette = Image.new("RGB", (width, palette_height), "white")
-            draw = ImageDraw.Draw(palette)
-            
-            font = ImageFont.load_default(size=palette_height // 6)
-            
-            block_width = width // len(colors)
-            
-            for i, hex_color in enumerate(colors):
-                x0 = i * block_width
-                x1 = (i + 1) * block_width
-                
-                # Draw color block
-                draw.rectangle([x0, 0, x1, palette_height], fill=hex_color)
-                
-                # Add text in middle
-                try:
-                    bbox = draw.textbbox((0, 0), hex_color, font=font)
-                    text_w = bbox[2] - bbox[0]
-                    text_h = bbox[3] - bbox[1]
-                except AttributeError:
-                    text_w, text_h = draw.textsize(hex_color, font=font)
-                
-                text_x = x0 + (block_width - text_w) // 2
-                text_y = (palette_height - text_h) // 2
-                
-                # Choose text color based on background brightness
-                rgb = tuple(int(hex_color[i:i+2], 16) for i in (1, 3, 5))
-                brightness = (rgb[0] * 299 + rgb[1] * 587 + rgb[2] * 114) / 1000
-                text_color = "white" if brightness < 128 else "black"
-                
-                draw.text((text_x, text_y), hex_color, fill=text_color, font=font)
+            content = [{ "type": "input_text",
+                         "text": (IMAGE_PALETTE_BATCH_PREFIX.format(count=len(images)) + IMAGE_PALETTE_PROMPT
+                                  + IMAGE_PALETTE_BATCH_SUFFIX.format(count=len(images))) }]
+            for number, (image_bytes, colors) in enumerate(images, start=1):
+                content.append({ "type": "input_text", "text": f"Image {number} {_palette_text(colors)}" })
+                content.append({ "type": "input_image", "image_url": jpeg_data_url(image_bytes) })
             
-            combined = Image.new("RGB", (width, img.height + palette_height))
-            combined.paste(img, (0, 0))
-            combined.paste(palette, (0, img.height))
-            
-            output_stream = io.BytesIO()
-            combined.save(output_stream, format='JPEG', quality=90)
-            combined_bytes = output_stream.getvalue()
-            
-            self.logger.info(f"Created combined image with palette. Size: {len(combined_bytes)} bytes")
-            return combined_bytes
+            async with llm_request_slot():
+                response = await get_openai_client().responses.parse(
+                    model="gpt-4.1",
+                    temperature=0.4,
+                    input=[{ "role": "user", "content": content }],
+                    text_format=BrandColorsBatch,
+                )
+
+            self.logger.info(f"LLM Usage: {response.usage}")
+
+            results = response.output_parsed.results
+            if len(results) == len(images):
+                return results
+            self.logger.warning(f"Batched LLM analysis returned {len(results)} results for {len(images)} images")
             
         except Exception as e:
-            self.logger.error(f"Error creating palette image: {str(e)}")
-            return screenshot_bytes
+            self.logger.error(f"Error in batched LLM analysis: {str(e)}")
+        
+        # Results can't be matched to images reliably; analyze each one on its own
+        return list(await asyncio.gather(*[self._analyze_with_llm(*image) for image in images]))
     
-    async def _analyze_with_llm(self, combined_image_bytes: bytes) -> BrandColors:
-        """Analyze the combined image using GPT-4.1"""
+    async def _analyze_with_llm(self, image_bytes: bytes, colors: List[str]) -> BrandColors:
+        """Analyze the screenshot and its extracted palette using GPT-4.1"""
         try:
-            client = OpenAI()
+            async with llm_request_slot():
+                response = await get_openai_client().responses.parse(
+                    model="gpt-4.1",
+                    temperature=0.4,
+                    input=[
+                    {
+                        "role": "user",
+                        "content": [
+                            { "type": "input_text", "text": IMAGE_PALETTE_PROMPT },
+                            { "type": "input_text", "text": _palette_text(colors) },
+                            {
+                                "type": "input_image",
+                                "image_url": jpeg_data_url(image_bytes),
+                            },
+                        ],
+                    }
+                ],
+                    text_format=BrandColors,
+                )
 
-            response = client.responses.parse(
-                model="gpt-4.1",
-                temperature=0.4,
-                input=[
-                {
-                    "role": "user",
-                    "content": [
-                        { "type": "input_text", "text": IMAGE_PALETTE_PROMPT },
-                        {
-                            "type": "input_image",
-                            "image_url": f"data:image/jpeg;base64,{base64.b64encode(combined_image_bytes).decode('utf-8')}",
-                        },
-                    ],
-                }
-            ],
-                text_format=BrandColors,
-            )
 
             self.logger.info(f"LLM Usage: {response.usage}")
 
@@ -296,9 +386,4 @@ class ScreenshotPaletteExtractor(BaseBrandExtractor, PlaywrightMixin):
         except Exception as e:
             self.logger.error(f"Error in LLM analysis: {str(e)}")
 
-            return BrandColors(
-                primaryColor="#333333",
-                secondaryColor="#666666",
-                backgroundColor="#FFFFFF",
-                linkColor="#0066CC"
-            )
+            return FALLBACK_BRAND_COLORS
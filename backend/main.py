@@ -1,17 +1,34 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, HttpUrl
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
 import logging
 from brand_extraction.analyzer import BrandAnalyzer, ExtractionMethod
+from brand_extraction.base import PlaywrightMixin, close_openai_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One analyzer for the app's lifetime so its extractor instances are reused
+    app.state.analyzer = BrandAnalyzer()
+    # Launch Chromium up front so the first request doesn't pay for it
+    await PlaywrightMixin.warm_up()
+    yield
+    # Close the shared Chromium instance used by all extractors
+    await PlaywrightMixin.shutdown()
+    await close_openai_client()
+
 app = FastAPI(
     title="AI Email Template Branding API",
     description="Extract brand colors and fonts from websites",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Responses carry nested metadata (and base64 images on the legacy endpoint)
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -26,6 +43,9 @@ class AnalyzeRequest(BaseModel):
     url: HttpUrl
     method: Optional[ExtractionMethod] = ExtractionMethod.DOM_NAIVE
 
+class BatchAnalyzeRequest(BaseModel):
+    urls: List[HttpUrl] = Field(..., min_length=1, max_length=20)
+
 class ScreenshotWithPaletteRequest(BaseModel):
     url: HttpUrl
     viewport_width: Optional[int] = 1920
@@ -47,6 +67,9 @@ class BrandAnalysisResponse(BaseModel):
     method: str
     metadata: Optional[Dict[str, Any]] = None
 
+class BatchAnalysisResponse(BaseModel):
+    results: List[BrandAnalysisResponse]
+
 class ScreenshotWithPaletteResponse(BaseModel):
     combined_image_base64: Optional[str]
     original_screenshot_base64: Optional[str]
@@ -72,14 +95,14 @@ async def health_check():
     return {"status": "healthy", "service": "brand-analyzer"}
 
 @app.post("/analyze", response_model=BrandAnalysisResponse)
-async def analyze_brand(request: AnalyzeRequest):
+async def analyze_brand(request: AnalyzeRequest, http_request: Request):
     """
     Analyze a website's brand elements using the specified method
     """
     try:
         logger.info(f"Analyzing brand for URL: {request.url} using method: {request.method}")
         
-        analyzer = BrandAnalyzer()
+        analyzer = http_request.app.state.analyzer
         result = await analyzer.analyze_website(str(request.url), request.method)
         
         if result.success:
@@ -109,15 +132,38 @@ async def analyze_brand(request: AnalyzeRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_brand_batch(request: BatchAnalyzeRequest, http_request: Request):
+    """
+    Analyze several websites with the screenshot-palette method, batching their LLM calls
+    """
+    try:
+        logger.info(f"Batch analyzing {len(request.urls)} URLs")
+        
+        analyzer = http_request.app.state.analyzer
+        results = await analyzer.analyze_websites_batched([str(url) for url in request.urls])
+        
+        # Per-URL failures are reported in their own result instead of failing the batch
+        return BatchAnalysisResponse(
+            results=[BrandAnalysisResponse(**result.model_dump()) for result in results]
+        )
+            
+    except Exception as e:
+        logger.error(f"Error batch analyzing {len(request.urls)} URLs: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
 @app.post("/screenshot-with-palette", response_model=ScreenshotWithPaletteResponse)
-async def take_screenshot_with_palette(request: ScreenshotWithPaletteRequest):
+async def take_screenshot_with_palette(request: ScreenshotWithPaletteRequest, http_request: Request):
     """
     Take a screenshot and add a color palette extracted from the image (Legacy endpoint)
     """
     try:
         logger.info(f"Taking screenshot with palette for URL: {request.url}")
         
-        analyzer = BrandAnalyzer()
+        analyzer = http_request.app.state.analyzer
         result = await analyzer.take_screenshot_with_palette_legacy(
             url=str(request.url),
             viewport_width=request.viewport_width,
@@ -1,12 +1,12 @@
 IMAGE_PALETTE_PROMPT = """
-You are a brand palette extractor. You must analyze a single image composed of:
+You are a brand palette extractor. You are given:
 
-1. A website screenshot (top).
-2. A palette legend (bottom): a row of color swatches with their exact HEX codes printed on each swatch.
+1. A website screenshot.
+2. An "Available palette" text line listing the exact HEX codes extracted from that screenshot, most common first.
 
 Goals:
 
-* Select brand role colors using only HEX codes that appear in the palette legend text.
+* Select brand role colors using only HEX codes that appear in the available palette list.
 * Return strictly one JSON object with exactly these keys:
 
   * primaryColor
@@ -42,7 +42,7 @@ Guidelines:
 - Avoid generic colors unless they're clearly intentional brand choices
 - Ensure colors have good contrast with the background
 - Return all colors in uppercase HEX format (e.g., #FF5733)
-- **Cookie/Ad popup handling**: If there are cookie consent banners, ad popups, or modal overlays that dim the background and make colors appear darker or less saturated, mentally increase the brightness and saturation of the colors you observe to compensate for this dimming effect when selecting from the palette legend
+- **Cookie/Ad popup handling**: If there are cookie consent banners, ad popups, or modal overlays that dim the background and make colors appear darker or less saturated, mentally increase the brightness and saturation of the colors you observe to compensate for this dimming effect when selecting from the available palette
 - REMEMBER THE COOKIE/AD POPUP HANDLING GUIDE.
 Output format:
 
@@ -54,6 +54,27 @@ Output format:
 }
 """
 
+IMAGE_PALETTE_BATCH_PREFIX = """
+You will receive {count} images, each showing a different website and preceded by its own
+"Image N Available palette" line. Apply the instructions below to every image independently,
+using only that image's palette.
+
+Wherever the instructions below say to return one JSON object, that object describes a single
+image. Your response must be one JSON object with a "results" list holding exactly {count} of
+those objects, in the same order as the images.
+"""
+
+IMAGE_PALETTE_BATCH_SUFFIX = """
+Batch output format (overrides the single-object output format above):
+
+{{
+  "results": [
+    {{ "primaryColor": "#RRGGBB", "secondaryColor": "#RRGGBB", "backgroundColor": "#RRGGBB", "linkColor": "#RRGGBB" }},
+    ... one object per image, {count} in total, in image order
+  ]
+}}
+"""
+
 IMAGE_PROMPT = """
 You are a brand color expert analyzing a website screenshot to extract brand colors.
 
@@ -96,4 +117,48 @@ Look carefully at the visual hierarchy and identify which colors are used for:
 - Text links and interactive elements
 
 Return your analysis as a JSON object with exactly these keys: primaryColor, secondaryColor, backgroundColor, linkColor
-"""
\ No newline at end of file
+"""
+
+CSS_PROMPT_TEMPLATE = """
+You are a brand color expert analyzing a website's CSS and HTML to extract brand colors.
+
+## CSS Rules with Colors:
+{css_rules}
+
+## HTML Elements with Color Attributes:
+{html_elements}
+
+## Computed Styles for Key Elements:
+{computed_styles}
+
+Based on this CSS and HTML analysis, determine the brand colors:
+
+1. **primaryColor**: The main brand accent color
+   - Look for the most prominent brand color in logos, headers, primary buttons
+   - This should be the color that represents the brand most strongly
+   - Often used in call-to-action buttons, primary navigation, or logo elements
+
+2. **secondaryColor**: Main text color
+   - Look for a secondary accent color used throughout the design
+   - Often complementary to the primary color
+
+3. **backgroundColor**: The main page background color
+   - Identify the dominant background color behind the main content
+   - Usually the lightest (or darkest in dark mode) large-area color
+   - Must have a high contrast ratio with the secondaryColor, since secondaryColor is used for text.
+   - Should be the color that covers the most area in the layout
+
+4. **linkColor**: The color used for hyperlinks
+   - Look for the color used in navigation links, text links, or interactive elements
+   - Often blue, but can be any color that indicates clickable text
+   - If unclear, use the color most commonly applied to inline text links
+
+Guidelines:
+- Focus on colors that appear in multiple important UI elements
+- Prioritize colors from branding elements (logos, headers, navigation)
+- Avoid generic colors unless they're clearly intentional brand choices
+- Ensure colors have good contrast with the background
+- Return all colors in uppercase HEX format (e.g., #FF5733)
+
+Return your analysis as a JSON object with exactly these keys: primaryColor, secondaryColor, backgroundColor, linkColor
+"""